@@ -3,21 +3,62 @@
 # Licensed under the MIT License - see LICENSE file for details
 # token_analyzer.py
 import os
+import sys
 import time
 import json
-import ast
-from typing import List, Dict, Set, Tuple
-from dataclasses import dataclass
+import re
+import base64
+import functools
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Set, Tuple, Iterator
+from dataclasses import dataclass, astuple
 from datetime import datetime, timedelta
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
-@dataclass
+# Chiusura del blocco di codice di ogni file nei report, con separatore
+SEPARATOR = "-" * 40
+FILE_BLOCK_END = ("\n```\n" + SEPARATOR + "\n").encode('utf-8')
+
+
+def dumps_json(data) -> bytes:
+    """Serializza in JSON indentato, usando orjson se disponibile."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2)
+    # ensure_ascii=False: stessi byte di orjson anche per path non ASCII
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def write_atomic(path: str, parts: List[bytes]):
+    """Scrive un file in modo atomico: prima su un file temporaneo, poi lo rinomina.
+
+    Chi legge il file (o lo osserva) non vede mai un contenuto scritto a metà.
+    """
+    tmp_path = path + '.tmp'
+    try:
+        with open(tmp_path, 'wb', buffering=1 << 20) as f:
+            f.writelines(parts)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@dataclass(frozen=True, slots=True)
 class FileInfo:
     path: str
+    basename: str
+    kind: str  # Categoria del report: 'models', 'views', 'templates', ...
     last_modified: float
     size: int
     token_estimate: int
-    content: str = None
+    content: bytes
 
 
 class TokenAwareAnalyzer:
@@ -44,6 +85,45 @@ class TokenAwareAnalyzer:
         'static': ['.js', '.css']
     }
 
+    # Punteggio base dei file Python per nome
+    FILE_PRIORITIES: Dict[str, int] = {
+        'settings.py': 100,
+        'urls.py': 90,
+        'models.py': 80,
+        'views.py': 70,
+        'forms.py': 60,
+        'serializers.py': 50,
+        'tests.py': 30
+    }
+
+    # Categorie del report, nell'ordine in cui compaiono nella struttura JSON
+    FILE_CATEGORIES: List[str] = [
+        'models', 'views', 'templates', 'forms', 'urls', 'static', 'other'
+    ]
+
+    # Suffisso del nome file -> categoria, valutati in ordine
+    CATEGORY_SUFFIXES: List[Tuple[Tuple[str, ...], str]] = [
+        (('models.py',), 'models'),
+        (('views.py',), 'views'),
+        (('.html',), 'templates'),
+        (('forms.py',), 'forms'),
+        (('urls.py',), 'urls'),
+        (('.js', '.css'), 'static'),
+    ]
+
+    # Versione del formato della cache su disco, da incrementare se FileInfo cambia
+    CACHE_VERSION = 4
+
+    # Definizioni di classi e funzioni, a qualsiasi livello di indentazione
+    DEF_RE = re.compile(rb'^\s*(?:class|def)\s+([A-Za-z_]\w*)', re.MULTILINE)
+
+    # Tipi attesi dei campi di FileInfo letti dalla cache su disco
+    # (il contenuto è salvato in base64)
+    CACHE_FIELD_TYPES = (str, str, str, float, int, int, str)
+
+    # Identificatori Python, usati per indicizzare il contenuto dei file
+    SYMBOL_RE = re.compile(rb'\b[A-Za-z_][A-Za-z0-9_]*\b')
+
     def __init__(self, project_root: str = '.', included_dirs=None):
         self.project_root = project_root
         self.output_dir = 'print_codebase'
@@ -51,6 +131,113 @@ class TokenAwareAnalyzer:
         self.included_dirs = [os.path.normpath(d) for d in (included_dirs or [])]
         os.makedirs(self.output_dir, exist_ok=True)
 
+        # Suffissi e directory escluse precalcolati per la scansione
+        self._suffixes = tuple({pat for pats in self.DJANGO_PATTERNS.values() for pat in pats})
+        self._excluded_dirs_frozen = frozenset(self.EXCLUDED_DIRECTORIES)
+
+        # Cache dei file letti: path -> (mtime, dimensione su disco, FileInfo)
+        self._file_cache: Dict[str, Tuple[float, int, FileInfo]] = {}
+        # Nomi di classi/funzioni definiti nelle views: path -> nomi
+        self._view_names_cache: Dict[str, Set[str]] = {}
+
+        # Indici per le correlazioni, ricostruiti per ogni elenco di file
+        self._indexed_files: List[FileInfo] = None
+        self._app_dir_index: Dict[str, List[FileInfo]] = {}
+        self._symbol_index: Dict[str, Set[str]] = {}
+        self._templates: List[FileInfo] = []
+        self._views: List[FileInfo] = []
+        self._view_paths: Set[str] = set()
+        self._scanned_names: Set[str] = set()
+        # Punteggio per tipo di file: path -> punteggio
+        self._type_scores: Dict[str, float] = {}
+        # Protegge le cache durante la lettura parallela dei file
+        self._cache_lock = threading.Lock()
+        # Indica se la cache è cambiata rispetto a quella salvata su disco
+        self._cache_dirty = False
+        self.cache_file = os.path.join(self.output_dir, '.cache.json')
+        self.load_cache()
+
+    def load_cache(self):
+        """Carica dal disco la cache dei file salvata dall'ultima esecuzione.
+
+        Il file può arrivare da un progetto clonato, quindi va trattato come input
+        non fidato: è JSON (il parsing non crea altro che dati) e ogni voce viene
+        validata prima dell'uso.
+        """
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            # La cache è valida solo per lo stesso formato e la stessa root di progetto
+            if data['version'] != self.CACHE_VERSION:
+                return
+            if data['project_root'] != os.path.abspath(self.project_root):
+                return
+
+            file_cache = {}
+            for mtime, size, fields in data['files'].values():
+                if not (type(mtime) is float and type(size) is int
+                        and len(fields) == len(self.CACHE_FIELD_TYPES)
+                        and all(type(v) is t for v, t in zip(fields, self.CACHE_FIELD_TYPES))):
+                    raise ValueError("voce della cache non valida")
+                path, basename, *rest, content = fields
+                content = base64.b64decode(content, validate=True)
+                file_info = FileInfo(sys.intern(path), sys.intern(basename), *rest, content)
+                file_cache[file_info.path] = (mtime, size, file_info)
+
+            view_names_cache = {}
+            for path, names in data['view_names'].items():
+                if not (type(names) is list and all(type(n) is str for n in names)):
+                    raise ValueError("voce della cache non valida")
+                view_names_cache[path] = set(names)
+
+            self._file_cache = file_cache
+            self._view_names_cache = view_names_cache
+        except Exception:
+            # Cache assente o non leggibile: verrà ricostruita
+            self._file_cache = {}
+            self._view_names_cache = {}
+
+    def save_cache(self):
+        """Salva la cache dei file su disco per i riavvii successivi, se è cambiata."""
+        with self._cache_lock:
+            if not self._cache_dirty:
+                return
+            self._cache_dirty = False
+
+            data = {
+                'version': self.CACHE_VERSION,
+                'project_root': os.path.abspath(self.project_root),
+                'files': {
+                    path: (mtime, size, (
+                        *astuple(file_info)[:-1],
+                        base64.b64encode(file_info.content).decode('ascii'),
+                    ))
+                    for path, (mtime, size, file_info) in self._file_cache.items()
+                },
+                'view_names': {
+                    path: sorted(names) for path, names in self._view_names_cache.items()
+                },
+            }
+        try:
+            write_atomic(self.cache_file, [json.dumps(data).encode('utf-8')])
+        except OSError as e:
+            self._cache_dirty = True
+            print(f"Errore nel salvataggio della cache {self.cache_file}: {e}")
+
+    def invalidate(self, path: str):
+        """Rimuove un file dalla cache, ad esempio dopo una modifica."""
+        rel_path = os.path.relpath(path, self.project_root)
+        with self._cache_lock:
+            if self._file_cache.pop(rel_path, None) is not None:
+                self._cache_dirty = True
+            if self._view_names_cache.pop(rel_path, None) is not None:
+                self._cache_dirty = True
+
+    def invalidate_many(self, paths):
+        """Rimuove dalla cache più file in una volta."""
+        for path in paths:
+            self.invalidate(path)
+
     def is_path_included(self, path: str) -> bool:
         """Verifica se un path è incluso nelle directory specificate."""
         if not self.included_dirs:
@@ -62,160 +249,309 @@ class TokenAwareAnalyzer:
             for included_dir in self.included_dirs
         )
 
-    def find_app_directory(self, file_path: str) -> str:
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def find_app_directory(file_path: str) -> str:
         """Identifica la directory dell'app Django dal path del file."""
         parts = file_path.split(os.sep)
         for i in range(len(parts) - 1, -1, -1):
             if any(f == parts[i] for f in ['views', 'models', 'forms', 'urls']):
-                return os.path.join(*parts[:i])
+                # Es. 'forms/contact_forms.py': l'app è la root del progetto
+                return os.path.join(*parts[:i]) if i > 0 else ''
         return os.path.dirname(file_path)
 
+    def categorize(self, filename: str) -> str:
+        """Restituisce la categoria del report a cui appartiene un file."""
+        for suffixes, category in self.CATEGORY_SUFFIXES:
+            if filename.endswith(suffixes):
+                return category
+        return 'other'
+
+    def build_indexes(self, all_files: List[FileInfo]):
+        """Precalcola gli indici usati per trovare i file correlati."""
+        self._indexed_files = all_files
+        self._app_dir_index = {}
+        self._symbol_index = {}
+        self._templates = []
+        self._views = []
+        self._view_paths = set()
+
+        for file in all_files:
+            app_dir = self.find_app_directory(file.path)
+            self._app_dir_index.setdefault(app_dir, []).append(file)
+
+            if file.kind == 'templates':
+                self._templates.append(file)
+            elif file.kind == 'views':
+                self._views.append(file)
+                self._view_paths.add(file.path)
+
+            # Solo il contenuto di views e forms viene cercato per nome
+            if file.kind in ('views', 'forms'):
+                for symbol in set(self.SYMBOL_RE.findall(file.content)):
+                    self._symbol_index.setdefault(symbol.decode('ascii'), set()).add(file.path)
+
+        self.index_template_names()
+
+    def index_template_names(self):
+        """Indicizza nelle views i nomi dei template che non sono identificatori.
+
+        Nomi come 'post-list' non compaiono tra i simboli: vengono cercati tutti
+        insieme con un'unica regex per view, invece di una scansione per nome.
+        """
+        names = {
+            os.path.splitext(template.basename)[0]
+            for template in self._templates
+        }
+        names = {name for name in names if name and not self.is_symbol(name)}
+        self._scanned_names = names
+        if not names or not self._views:
+            return
+
+        # Lookahead per trovare anche occorrenze sovrapposte, nomi lunghi prima
+        alternatives = b'|'.join(
+            re.escape(name.encode('utf-8'))
+            for name in sorted(names, key=len, reverse=True)
+        )
+        pattern = re.compile(b'(?=(' + alternatives + b'))')
+
+        for view in self._views:
+            found = {match.group(1).decode('utf-8') for match in pattern.finditer(view.content)}
+            # Un nome contenuto in uno trovato è presente anch'esso
+            found = {name for name in names for other in found if name in other}
+            for name in found:
+                self._symbol_index.setdefault(name, set()).add(view.path)
+
+    @staticmethod
+    def is_symbol(name: str) -> bool:
+        """Verifica se un nome è un identificatore ASCII (cioè indicizzabile da SYMBOL_RE)."""
+        return name.isascii() and name.isidentifier()
+
+    def files_containing(self, name: str, candidates: List[FileInfo]) -> Set[str]:
+        """Restituisce i path dei file candidati il cui contenuto contiene il nome."""
+        if name in self._scanned_names or self.is_symbol(name):
+            return self._symbol_index.get(name, set())
+        needle = name.encode('utf-8')
+        return {file.path for file in candidates if needle in file.content}
+
     def get_correlated_files(self, file_info: FileInfo, all_files: List[FileInfo]) -> Set[str]:
         """Trova i file correlati basandosi sul contesto Django."""
+        if all_files is not self._indexed_files:
+            self.build_indexes(all_files)
+
         correlated = set()
         app_dir = self.find_app_directory(file_info.path)
+        app_files = self._app_dir_index.get(app_dir, [])
 
         # Se è una view, cerca models, forms, urls e templates correlati
-        if 'views.py' in file_info.path:
-            view_content = file_info.content
-
+        if file_info.kind == 'views':
             # Estrai i nomi delle classi e funzioni dalla view
-            try:
-                tree = ast.parse(view_content)
-                view_names = {
-                    node.name.lower()
-                    for node in ast.walk(tree)
-                    if isinstance(node, (ast.ClassDef, ast.FunctionDef))
-                }
-            except:
-                view_names = set()
-
-            for other_file in all_files:
-                other_path = other_file.path
-
-                # Stesso modulo/app
-                if app_dir in other_path:
-                    if any(x in other_path for x in ['models.py', 'forms.py', 'urls.py']):
-                        correlated.add(other_path)
-
-                # Template correlati
-                if other_path.endswith('.html'):
-                    if any(name in other_path.lower() for name in view_names):
-                        correlated.add(other_path)
+            view_names = self._view_names_cache.get(file_info.path)
+            if view_names is None:
+                view_names = self.extract_view_names(file_info.content)
+                with self._cache_lock:
+                    self._view_names_cache[file_info.path] = view_names
+                    self._cache_dirty = True
+
+            # Stesso modulo/app
+            for other_file in app_files:
+                if other_file.kind in ('models', 'forms', 'urls'):
+                    correlated.add(other_file.path)
+
+            # Template correlati
+            for template in self._templates:
+                template_path = template.path.lower()
+                if any(name in template_path for name in view_names):
+                    correlated.add(template.path)
 
         # Se è un model, cerca views e forms correlati
-        elif 'models.py' in file_info.path:
-            model_name = os.path.splitext(os.path.basename(file_info.path))[0]
-            for other_file in all_files:
-                if app_dir in other_file.path:
-                    if any(x in other_file.path for x in ['views.py', 'forms.py']):
-                        # Verifica se il model è importato
-                        if model_name in other_file.content:
-                            correlated.add(other_file.path)
+        elif file_info.kind == 'models':
+            model_name = os.path.splitext(file_info.basename)[0]
+            candidates = [f for f in app_files if f.kind in ('views', 'forms')]
+            # Verifica se il model è importato
+            containing = self.files_containing(model_name, candidates)
+            correlated.update(f.path for f in candidates if f.path in containing)
 
         # Se è un template, cerca le views correlate
-        elif file_info.path.endswith('.html'):
-            template_name = os.path.splitext(os.path.basename(file_info.path))[0]
-            for other_file in all_files:
-                if 'views.py' in other_file.path:
-                    if template_name in other_file.content:
-                        correlated.add(other_file.path)
-                        # Aggiungi anche i models e forms usati in questa view
-                        app_files = [f for f in all_files if app_dir in f.path]
-                        for app_file in app_files:
-                            if any(x in app_file.path for x in ['models.py', 'forms.py']):
-                                correlated.add(app_file.path)
+        elif file_info.kind == 'templates':
+            template_name = os.path.splitext(file_info.basename)[0]
+            matching_views = [
+                path for path in self.files_containing(template_name, self._views)
+                if path in self._view_paths
+            ]
+            if matching_views:
+                correlated.update(matching_views)
+                # Aggiungi anche i models e forms usati in questa view
+                for app_file in app_files:
+                    if app_file.kind in ('models', 'forms'):
+                        correlated.add(app_file.path)
 
         return correlated
 
-    def estimate_tokens(self, content: str) -> int:
+    def extract_view_names(self, content: bytes) -> Set[str]:
+        """Estrae i nomi (in minuscolo) di classi e funzioni definite in un file."""
+        return {match.group(1).decode('ascii').lower() for match in self.DEF_RE.finditer(content)}
+
+    def estimate_tokens(self, content: bytes) -> int:
         """Stima approssimativa del numero di token in un contenuto."""
         return len(content) // self.CHARS_PER_TOKEN
 
-    def get_file_info(self, file_path: str) -> FileInfo:
+    def read_file(self, abs_path: str, size: int) -> bytes:
+        """Legge il contenuto grezzo di un file con una sola read della dimensione nota.
+
+        Usa direttamente os.open/os.read: la dimensione è già nota dallo stat della
+        scansione, quindi si evitano fstat, lseek e il buffering di open().
+        """
+        fd = os.open(abs_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+        try:
+            chunks = [os.read(fd, size + 1)]
+            # Il file è cresciuto dopo lo stat: leggi fino alla fine
+            if len(chunks[0]) > size:
+                while chunk := os.read(fd, 1 << 16):
+                    chunks.append(chunk)
+        finally:
+            os.close(fd)
+
+        return b''.join(chunks)
+
+    def get_file_info(self, file_path: str, st: os.stat_result = None) -> FileInfo:
         """Ottiene informazioni dettagliate su un file, inclusa la stima dei token."""
         abs_path = os.path.join(self.project_root, file_path)
-        with open(abs_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-            return FileInfo(
-                path=file_path,
-                last_modified=os.path.getmtime(abs_path),
-                size=len(content),
-                token_estimate=self.estimate_tokens(content),
-                content=content
-            )
+        if st is None:
+            st = os.stat(abs_path)
+
+        # Riusa il FileInfo in cache se il file non è cambiato
+        cached = self._file_cache.get(file_path)
+        if cached is not None and cached[:2] == (st.st_mtime, st.st_size):
+            return cached[2]
+
+        content = self.read_file(abs_path, st.st_size)
+        basename = sys.intern(os.path.basename(file_path))
+        file_info = FileInfo(
+            path=file_path,
+            basename=basename,
+            kind=self.categorize(basename),
+            last_modified=st.st_mtime,
+            size=len(content),
+            token_estimate=self.estimate_tokens(content),
+            content=content
+        )
+        with self._cache_lock:
+            self._file_cache[file_path] = (st.st_mtime, st.st_size, file_info)
+            self._view_names_cache.pop(file_path, None)
+            self._cache_dirty = True
+        return file_info
+
+    def load_file(self, candidate: Tuple[str, os.stat_result]) -> FileInfo:
+        """Legge un file candidato, restituendo None in caso di errore."""
+        rel_path, st = candidate
+        try:
+            return self.get_file_info(rel_path, st)
+        except Exception as e:
+            print(f"Errore nella lettura del file {rel_path}: {e}")
+            return None
+
+    def scan_directory(self, root: str) -> Iterator[Tuple[str, List[os.DirEntry]]]:
+        """Percorre ricorsivamente una directory con os.scandir, saltando quelle escluse.
+
+        Per ogni directory restituisce il suo path e le voci dei file contenuti.
+        """
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError:
+            return
 
-    def get_project_files(self) -> List[FileInfo]:
-        """Raccoglie tutti i file rilevanti con le loro informazioni."""
         files = []
-        for root, dirs, filenames in os.walk(self.project_root):
-            # Filtra le directory escluse
-            dirs[:] = [d for d in dirs if d not in self.EXCLUDED_DIRECTORIES]
+        subdirs = []
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name not in self._excluded_dirs_frozen:
+                        subdirs.append(entry.path)
+                elif entry.is_file():
+                    files.append(entry)
+            except OSError:
+                continue
+
+        yield root, files
+        for subdir in subdirs:
+            yield from self.scan_directory(subdir)
 
+    def get_project_files(self) -> List[FileInfo]:
+        """Raccoglie tutti i file rilevanti con le loro informazioni."""
+        candidates = []
+        for root, entries in self.scan_directory(self.project_root):
             # Verifica se la directory corrente è inclusa nel filtro
             rel_root = os.path.relpath(root, self.project_root)
             if not self.is_path_included(rel_root):
                 continue
 
-            for file in filenames:
+            for entry in entries:
                 # Verifica sia per file Python che per template/static
-                is_django_file = any(
-                    file.endswith(pat.replace('*.py', '.py'))
-                    or file.endswith(pat)
-                    for patterns in self.DJANGO_PATTERNS.values()
-                    for pat in patterns
-                )
-
-                # Verifica specifica per i template
-                is_template = file.endswith('.html') and ('templates' in root or '/templates/' in root)
-
-                if is_django_file or is_template:
-                    rel_path = os.path.relpath(os.path.join(root, file), self.project_root)
+                if entry.name.endswith(self._suffixes):
+                    rel_path = sys.intern(os.path.relpath(entry.path, self.project_root))
                     try:
-                        file_info = self.get_file_info(rel_path)
-                        files.append(file_info)
-                    except Exception as e:
+                        candidates.append((rel_path, entry.stat()))
+                    except OSError as e:
                         print(f"Errore nella lettura del file {rel_path}: {e}")
 
-        return sorted(files, key=lambda x: x.last_modified, reverse=True)
-
-    def calculate_file_score(self, file_info: FileInfo, all_files: List[FileInfo]) -> float:
-        """Calcola un punteggio di priorità per ogni file, considerando le correlazioni."""
+        # Legge i file in parallelo: il lavoro è dominato dall'I/O
+        max_workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            files = [f for f in pool.map(self.load_file, candidates) if f is not None]
+
+        # Rimuovi dalla cache i file non più presenti
+        # (le chiavi sono già relative alla root: niente relpath come in invalidate)
+        seen = {file_info.path for file_info in files}
+        with self._cache_lock:
+            for path in list(self._file_cache):
+                if path not in seen:
+                    self._file_cache.pop(path, None)
+                    self._view_names_cache.pop(path, None)
+                    self._cache_dirty = True
+            for path in list(self._type_scores):
+                if path not in seen:
+                    del self._type_scores[path]
+
+        return files
+
+    def type_score(self, file_info: FileInfo) -> float:
+        """Punteggio base per tipo di file; dipende solo dal path ed è memorizzato."""
+        file_path = file_info.path
+        score = self._type_scores.get(file_path)
+        if score is not None:
+            return score
+
+        filename = file_info.basename
         score = 0.0
+        if filename.endswith('.html'):
+            if 'base.html' in filename:
+                score = 85.0
+            elif '/templates/' in file_path:
+                score = 65.0
+        elif filename.endswith('.py'):
+            score = float(self.FILE_PRIORITIES.get(filename, 40))
+        elif filename.endswith(('.js', '.css')):
+            score = 35.0
 
-        # Punteggio base per tipo di file
-        file_priorities = {
-            'settings.py': 100,
-            'urls.py': 90,
-            'models.py': 80,
-            'views.py': 70,
-            'forms.py': 60,
-            'serializers.py': 50,
-            'tests.py': 30
-        }
+        self._type_scores[file_path] = score
+        return score
 
-        filename = os.path.basename(file_info.path)
+    def calculate_file_score(self, file_info: FileInfo, now: float = None) -> float:
+        """Calcola un punteggio di priorità per ogni file.
 
-        # Controlla se il file è stato modificato di recente
-        hours_since_modification = (time.time() - file_info.last_modified) / 3600
-        is_recently_modified = hours_since_modification < 24  # Modificato nelle ultime 24 ore
+        I bonus per i file recenti e per i loro correlati sono aggiunti da
+        select_files_within_limit, che calcola le correlazioni una sola volta.
+        """
+        if now is None:
+            now = time.time()
+        score = 0.0
 
-        # Se il file è stato modificato di recente, dai priorità ai file correlati
-        if is_recently_modified:
-            correlated_files = self.get_correlated_files(file_info, all_files)
-            if file_info.path in correlated_files:
-                score += 150  # Alta priorità per i file correlati a modifiche recenti
+        hours_since_modification = (now - file_info.last_modified) / 3600
 
         # Calcolo punteggio base per tipo di file
-        if filename.endswith('.html'):
-            if 'base.html' in filename:
-                score += 85
-            elif '/templates/' in file_info.path:
-                score += 65
-        elif filename.endswith('.py'):
-            score += file_priorities.get(filename, 40)
-        elif filename.endswith(('.js', '.css')):
-            score += 35
+        score += self.type_score(file_info)
 
         # Bonus/Penalità aggiuntive
         recency_score = max(0, 100 - (hours_since_modification / 24) * 10)
@@ -226,39 +562,52 @@ class TokenAwareAnalyzer:
 
         return score
 
-    def select_files_within_limit(self, files: List[FileInfo]) -> List[FileInfo]:
+    def select_files_within_limit(self, files: List[FileInfo], now: float = None) -> List[FileInfo]:
         """Seleziona i file da includere, dando priorità ai file correlati."""
+        if now is None:
+            now = time.time()
         self.selected_files = []
         total_tokens = 0
 
-        # Prima passa: trova i file modificati di recente e i loro correlati
-        recent_files = set()
-        correlated_to_recent = set()
+        # Colonne dei campi numerici, estratte una sola volta per tutti i passi
+        mtimes = [file.last_modified for file in files]
+        tokens = [file.token_estimate for file in files]
 
-        for file in files:
-            hours_since_modification = (time.time() - file.last_modified) / 3600
-            if hours_since_modification < 24:  # Modificato nelle ultime 24 ore
-                recent_files.add(file.path)
-                correlated = self.get_correlated_files(file, files)
-                correlated_to_recent.update(correlated)
+        # Prima passa: trova i file modificati di recente
+        recent_cutoff = now - 24 * 3600  # Modificato nelle ultime 24 ore
+        recent = [files[i] for i, mtime in enumerate(mtimes) if mtime > recent_cutoff]
+        recent_files = {file.path for file in recent}
+
+        # Correlazioni solo se ci sono modifiche recenti: nel caso comune di un
+        # progetto fermo si evitano del tutto indici e scansioni
+        correlated_to_recent = set()
+        for file in recent:
+            correlated_to_recent.update(self.get_correlated_files(file, files))
 
-        # Calcola i punteggi e ordina i file
+        # Calcola i punteggi: heap ordinato per punteggio decrescente,
+        # a parità di punteggio vale l'ordine originale
         scored_files = []
-        for file in files:
-            base_score = self.calculate_file_score(file, files)
+        for i, file in enumerate(files):
+            base_score = self.calculate_file_score(file, now)
             if file.path in recent_files:
                 base_score += 200  # Bonus per file modificati di recente
             elif file.path in correlated_to_recent:
                 base_score += 150  # Bonus per file correlati a modifiche recenti
-            scored_files.append((file, base_score))
+            scored_files.append((-base_score, i, file))
 
-        scored_files.sort(key=lambda x: x[1], reverse=True)
+        if not scored_files:
+            return self.selected_files
 
-        # Seleziona i file rispettando il limite di token
-        for file, score in scored_files:
-            if total_tokens + file.token_estimate <= self.MAX_TOKENS:
+        heapq.heapify(scored_files)
+        min_tokens = min(tokens)
+
+        # Seleziona i file rispettando il limite di token, fermandosi
+        # quando nessun file può più rientrare nel budget residuo
+        while scored_files and self.MAX_TOKENS - total_tokens >= min_tokens:
+            _, i, file = heapq.heappop(scored_files)
+            if total_tokens + tokens[i] <= self.MAX_TOKENS:
                 self.selected_files.append(file)
-                total_tokens += file.token_estimate
+                total_tokens += tokens[i]
 
         return self.selected_files
 
@@ -266,81 +615,74 @@ class TokenAwareAnalyzer:
         """Genera un unico report completo che include sia la struttura che i contenuti."""
         timestamp = time.strftime('%Y%m%d_%H%M%S')
         output_file = os.path.join(self.output_dir, f'codebase_report.txt')
+        now = time.time()
+
+        # Evita che la cache delle app cresca senza limiti tra un report e l'altro
+        self.find_app_directory.cache_clear()
 
-        all_files = self.get_project_files()
-        selected_files = self.select_files_within_limit(all_files)
+        # File più recenti per primi: ordine della struttura e dei file esclusi
+        all_files = sorted(self.get_project_files(), key=lambda x: x.last_modified, reverse=True)
+        selected_files = self.select_files_within_limit(all_files, now)
 
         # Prepara la struttura del progetto
+        files_by_type = {category: [] for category in self.FILE_CATEGORIES}
         project_structure = {
             'timestamp': timestamp,
             'project_root': self.project_root,
-            'files_by_type': {
-                'models': [],
-                'views': [],
-                'templates': [],
-                'forms': [],
-                'urls': [],
-                'static': [],
-                'other': []
-            }
+            'files_by_type': files_by_type
         }
 
         # Categorizza i file
         for file in all_files:
-            file_info = {
-                'path': file.path,
-            }
+            files_by_type[file.kind].append({'path': file.path})
+
+        # Il report viene composto in memoria e scritto con una sola chiamata
+        parts: List[bytes] = []
+
+        # 1. Header e statistiche
+        total_tokens = sum(file.token_estimate for file in selected_files)
+        parts.append((
+            "=== DJANGO PROJECT ANALYSIS ===\n"
+            f"Generated: {timestamp}\n"
+            + "=" * 40 + "\n\n"
+            "STATISTICHE GENERALI:\n"
+            f"- Files inclusi: {len(selected_files)}\n"
+            f"- Token totali: {total_tokens:,} / {self.MAX_TOKENS:,}\n"
+            f"- Utilizzo token: {(total_tokens / self.MAX_TOKENS) * 100:.1f}%\n\n"
+        ).encode('utf-8'))
+
+        # 2. Struttura del progetto in formato JSON
+        parts.append(b"=== STRUTTURA DEL PROGETTO ===\n```json\n")
+        parts.append(dumps_json(project_structure))
+        parts.append(b"\n```\n\n")
+
+        # 3. Contenuto dei file
+        parts.append(b"=== CONTENUTO DEI FILE ===\n")
+        parts.extend([
+            part
+            for file_info in selected_files
+            for part in (
+                f"\n--- {file_info.path} ---\n"
+                f"Ultima modifica: {datetime.fromtimestamp(file_info.last_modified)}\n"
+                "```\n".encode('utf-8'),  # Inizio del blocco di codice
+                file_info.content,
+                FILE_BLOCK_END,
+            )
+        ])
+
+        # 4. Files esclusi
+        selected_paths = {file.path for file in selected_files}
+        excluded_files = [f for f in all_files if f.path not in selected_paths]
+        if excluded_files:
+            parts.append(b"\n=== FILES ESCLUSI ===\n")
+            parts.append("".join(
+                f"- {file.path} ({file.token_estimate:,} token stimati)\n"
+                for file in excluded_files
+            ).encode('utf-8'))
+
+        write_atomic(output_file, parts)
 
-            filename = os.path.basename(file.path)
-            if 'models.py' in filename:
-                project_structure['files_by_type']['models'].append(file_info)
-            elif 'views.py' in filename:
-                project_structure['files_by_type']['views'].append(file_info)
-            elif filename.endswith('.html'):
-                project_structure['files_by_type']['templates'].append(file_info)
-            elif 'forms.py' in filename:
-                project_structure['files_by_type']['forms'].append(file_info)
-            elif 'urls.py' in filename:
-                project_structure['files_by_type']['urls'].append(file_info)
-            elif filename.endswith(('.js', '.css')):
-                project_structure['files_by_type']['static'].append(file_info)
-            else:
-                project_structure['files_by_type']['other'].append(file_info)
-
-        with open(output_file, 'w', encoding='utf-8') as f:
-            # 1. Header e statistiche
-            f.write("=== DJANGO PROJECT ANALYSIS ===\n")
-            f.write(f"Generated: {timestamp}\n")
-            f.write("=" * 40 + "\n\n")
-
-            total_tokens = sum(file.token_estimate for file in selected_files)
-            f.write(f"STATISTICHE GENERALI:\n")
-            f.write(f"- Files inclusi: {len(selected_files)}\n")
-            f.write(f"- Token totali: {total_tokens:,} / {self.MAX_TOKENS:,}\n")
-            f.write(f"- Utilizzo token: {(total_tokens / self.MAX_TOKENS) * 100:.1f}%\n\n")
-
-            # 2. Struttura del progetto in formato JSON
-            f.write("=== STRUTTURA DEL PROGETTO ===\n")
-            f.write("```json\n")
-            f.write(json.dumps(project_structure, indent=2))
-            f.write("\n```\n\n")
-
-            # 3. Contenuto dei file
-            f.write("=== CONTENUTO DEI FILE ===\n")
-            for file_info in selected_files:
-                f.write(f"\n--- {file_info.path} ---\n")
-                f.write(f"Ultima modifica: {datetime.fromtimestamp(file_info.last_modified)}\n")
-                f.write("```\n")  # Inizio del blocco di codice
-                f.write(file_info.content)
-                f.write("\n```\n")  # Fine del blocco di codice
-                f.write("-" * 40 + "\n")
-
-            # 4. Files esclusi
-            excluded_files = [f for f in all_files if f not in selected_files]
-            if excluded_files:
-                f.write("\n=== FILES ESCLUSI ===\n")
-                for file in excluded_files:
-                    f.write(f"- {file.path} ({file.token_estimate:,} token stimati)\n")
+        self.save_cache()
 
     def analyze_directory(self, directory_path: str):
         """Analizza una directory e salva l'output in un file."""
@@ -0,0 +1,184 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import dj_context_print
+from dj_context_print import FileInfo, TokenAwareAnalyzer, dumps_json
+
+
+class FindAppDirectoryTest(unittest.TestCase):
+    def test_app_package_at_project_root(self):
+        path = os.path.join('forms', 'contact_forms.py')
+        self.assertEqual(TokenAwareAnalyzer.find_app_directory(path), '')
+
+    def test_nested_app_package(self):
+        path = os.path.join('blog', 'views', 'post.py')
+        self.assertEqual(TokenAwareAnalyzer.find_app_directory(path), 'blog')
+
+
+class DumpsJsonTest(unittest.TestCase):
+    @unittest.skipIf(dj_context_print.orjson is None, 'orjson non installato')
+    def test_fallback_matches_orjson(self):
+        data = {'files_by_type': {'templates': [{'path': 'città/perché.html'}], 'other': []}}
+        expected = dumps_json(data)
+
+        orjson = dj_context_print.orjson
+        dj_context_print.orjson = None
+        try:
+            self.assertEqual(dumps_json(data), expected)
+        finally:
+            dj_context_print.orjson = orjson
+
+
+class GenerateReportTest(unittest.TestCase):
+    def setUp(self):
+        self.old_cwd = os.getcwd()
+        self.tmp = tempfile.TemporaryDirectory()
+        os.chdir(self.tmp.name)
+
+    def tearDown(self):
+        os.chdir(self.old_cwd)
+        self.tmp.cleanup()
+
+    def write(self, path, content, age=0):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    def test_root_level_app_package_with_recent_view(self):
+        # Un file in 'forms/' alla root e una view modificata di recente
+        self.write(os.path.join('forms', 'contact_forms.py'), 'class ContactForm: pass\n', age=3 * 86400)
+        self.write(os.path.join('blog', 'views.py'), 'def index(request): pass\n')
+
+        analyzer = TokenAwareAnalyzer()
+        analyzer.generate_report()
+
+        paths = {f.path for f in analyzer.selected_files}
+        self.assertIn(os.path.join('forms', 'contact_forms.py'), paths)
+        self.assertIn(os.path.join('blog', 'views.py'), paths)
+
+    def test_deleted_file_evicted_with_absolute_project_root(self):
+        project = os.path.join(self.tmp.name, 'proj')
+        views = os.path.join(project, 'shop', 'views.py')
+        self.write(views, 'def index(request): pass\n')
+        self.write(os.path.join(project, 'shop', 'models.py'), 'class Product: pass\n')
+
+        analyzer = TokenAwareAnalyzer(project_root=project)
+        analyzer.generate_report()
+        self.assertIn(os.path.join('shop', 'views.py'), analyzer._file_cache)
+
+        os.remove(views)
+        analyzer.generate_report()
+        self.assertNotIn(os.path.join('shop', 'views.py'), analyzer._file_cache)
+        self.assertNotIn(os.path.join('shop', 'views.py'), analyzer._type_scores)
+        self.assertIn(os.path.join('shop', 'models.py'), analyzer._file_cache)
+
+    def test_cache_reloaded_and_saved_only_when_changed(self):
+        views = os.path.join('shop', 'views.py')
+        self.write(views, 'def index(request): pass\n')
+
+        analyzer = TokenAwareAnalyzer()
+        analyzer.generate_report()
+
+        # Nessun file cambiato: la cache non viene riscritta
+        os.utime(analyzer.cache_file, ns=(0, 0))
+        analyzer.generate_report()
+        self.assertEqual(os.stat(analyzer.cache_file).st_mtime_ns, 0)
+
+        # Un file modificato: la cache viene riscritta con il nuovo contenuto
+        self.write(views, 'def detail(request): pass\n')
+        analyzer.generate_report()
+        self.assertNotEqual(os.stat(analyzer.cache_file).st_mtime_ns, 0)
+
+        restarted = TokenAwareAnalyzer()
+        self.assertEqual(restarted._file_cache.keys(), analyzer._file_cache.keys())
+        self.assertEqual(restarted._file_cache[views][2].content, b'def detail(request): pass\n')
+
+    def test_invalid_cache_is_ignored(self):
+        os.makedirs('print_codebase', exist_ok=True)
+        with open(os.path.join('print_codebase', '.cache.json'), 'wb') as f:
+            f.write(b'not a cache')
+
+        analyzer = TokenAwareAnalyzer()
+        self.assertEqual(analyzer._file_cache, {})
+
+    def test_cache_with_wrong_types_is_ignored(self):
+        os.makedirs('print_codebase', exist_ok=True)
+        entry = [1.0, 4, ['views.py', 'views.py', 'views', 1.0, 4, 1, ['not', 'base64']]]
+        with open(os.path.join('print_codebase', '.cache.json'), 'w', encoding='utf-8') as f:
+            json.dump({
+                'version': TokenAwareAnalyzer.CACHE_VERSION,
+                'project_root': os.path.abspath('.'),
+                'files': {'views.py': entry},
+                'view_names': {},
+            }, f)
+
+        analyzer = TokenAwareAnalyzer()
+        self.assertEqual(analyzer._file_cache, {})
+
+    def test_template_names_match_views_by_substring(self):
+        # Nomi non identificatori sovrapposti e un nome prefisso di uno più lungo
+        contents = {
+            os.path.join('a', 'views.py'): "render(request, 'post-list-x.html')\n",
+            os.path.join('b', 'views.py'): "render(request, 'post-list.html')\n",
+            os.path.join('c', 'views.py'): "render(request, 'list-x-y.html')\n",
+        }
+        for path, content in contents.items():
+            self.write(path, content)
+        names = ['post-list', 'list-x', 'post-list-x', 'list-x-y', 'unused-name']
+        for name in names:
+            self.write(os.path.join('t', 'templates', f'{name}.html'), '<p></p>\n')
+
+        analyzer = TokenAwareAnalyzer()
+        files = analyzer.get_project_files()
+        templates = {os.path.splitext(f.basename)[0]: f for f in files if f.kind == 'templates'}
+        for name in names:
+            expected = {path for path, content in contents.items() if name in content}
+            correlated = analyzer.get_correlated_files(templates[name], files)
+            self.assertEqual(correlated & contents.keys(), expected, name)
+
+    def test_selection_matches_stable_sort_and_fill(self):
+        now = time.time()
+        # Punteggi uguali a gruppi e un budget che costringe a saltare file
+        files = [
+            FileInfo(f'f{i}.txt', f'f{i}.txt', 'other', now - age * 86400, tokens * 4, tokens, b'')
+            for i, (age, tokens) in enumerate(
+                [(2, 45), (5, 20), (2, 70), (2, 45), (5, 70), (5, 20), (2, 20), (2, 70), (5, 45)] * 2
+            )
+        ]
+
+        analyzer = TokenAwareAnalyzer()
+        analyzer.MAX_TOKENS = 120
+        selected = analyzer.select_files_within_limit(files, now)
+
+        expected = []
+        total_tokens = 0
+        for file in sorted(files, key=lambda f: -analyzer.calculate_file_score(f, now)):
+            if total_tokens + file.token_estimate <= analyzer.MAX_TOKENS:
+                expected.append(file)
+                total_tokens += file.token_estimate
+        self.assertEqual(selected, expected)
+        self.assertLess(len(selected), len(files))
+
+    def test_report_lists_most_recent_files_first(self):
+        self.write(os.path.join('a', 'models.py'), 'x = 1\n', age=3 * 86400)
+        self.write(os.path.join('b', 'models.py'), 'x = 2\n', age=2 * 86400)
+        self.write(os.path.join('c', 'models.py'), 'x = 3\n', age=1 * 86400)
+
+        TokenAwareAnalyzer().generate_report()
+
+        with open(os.path.join('print_codebase', 'codebase_report.txt'), encoding='utf-8') as f:
+            report = f.read()
+        positions = [report.index(f'"{d}/models.py"') for d in ('c', 'b', 'a')]
+        self.assertEqual(positions, sorted(positions))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,6 +3,7 @@
 # Licensed under the MIT License - see LICENSE file for details
 import time
 import os
+import threading
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from dj_context_print import TokenAwareAnalyzer
@@ -11,13 +12,13 @@ from dj_context_print import TokenAwareAnalyzer
 class DjangoWatcher:
     def __init__(self, directory_to_watch='./', cooldown=5, included_dirs=None):
         self.DIRECTORY_TO_WATCH = directory_to_watch
-        self.cooldown = cooldown  # Tempo minimo tra le analisi
+        self.cooldown = cooldown  # Attesa dopo l'ultima modifica prima dell'analisi
         self.included_dirs = included_dirs or []  # Lista delle directory da monitorare
         self.observer = Observer()
         self.last_run = 0
 
-    def run(self):
-        event_handler = DjangoHandler(self.cooldown, self.included_dirs)
+    def run(self, analyzer=None):
+        event_handler = DjangoHandler(self.cooldown, self.included_dirs, analyzer)
         self.observer.schedule(event_handler, self.DIRECTORY_TO_WATCH, recursive=True)
         self.observer.start()
         print(f"Monitoraggio avviato nella directory: {self.DIRECTORY_TO_WATCH}")
@@ -39,12 +40,20 @@ class DjangoWatcher:
 
 
 class DjangoHandler(FileSystemEventHandler):
-    def __init__(self, cooldown, included_dirs=None):
+    def __init__(self, cooldown, included_dirs=None, analyzer=None):
         self.cooldown = cooldown
-        self.last_run = 0
         self.relevant_extensions = {'.py', '.html', '.js', '.css'}
         self.included_dirs = [os.path.normpath(d) for d in (included_dirs or [])]
-        self.analyzer = TokenAwareAnalyzer(included_dirs=self.included_dirs)
+        # Riusa l'analyzer del report iniziale, con la sua cache già popolata
+        self.analyzer = analyzer or TokenAwareAnalyzer(included_dirs=self.included_dirs)
+        self.output_dir = os.path.abspath(self.analyzer.output_dir)
+
+        # Modifiche in attesa: il report parte dopo `cooldown` secondi senza nuovi eventi
+        self._pending_paths = set()
+        self._timer = None
+        self._lock = threading.Lock()
+        # Evita che due report vengano generati in contemporanea
+        self._report_lock = threading.Lock()
 
     def is_path_included(self, path):
         if not self.included_dirs:
@@ -61,6 +70,11 @@ class DjangoHandler(FileSystemEventHandler):
         if event.is_directory:
             return
 
+        # Ignora i file scritti dall'analyzer stesso (report, cache, temporanei)
+        src_path = os.path.abspath(event.src_path)
+        if src_path == self.output_dir or src_path.startswith(self.output_dir + os.sep):
+            return
+
         # Verifica se il path è nelle directory incluse
         if not self.is_path_included(event.src_path):
             return
@@ -69,29 +83,43 @@ class DjangoHandler(FileSystemEventHandler):
         if file_ext not in self.relevant_extensions:
             return
 
-        # Controlla il cooldown
-        current_time = time.time()
-        if current_time - self.last_run < self.cooldown:
+        # Accumula la modifica e riavvia il timer
+        with self._lock:
+            self._pending_paths.add(event.src_path)
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self.cooldown, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush(self):
+        with self._lock:
+            paths = self._pending_paths
+            self._pending_paths = set()
+            self._timer = None
+
+        if not paths:
             return
 
-        self.last_run = current_time
-
-        print(f"\nRilevata modifica in: {event.src_path}")
-        print("Generazione nuovo report...")
+        with self._report_lock:
+            for path in sorted(paths):
+                print(f"\nRilevata modifica in: {path}")
+            print("Generazione nuovo report...")
 
-        try:
-            self.analyzer.generate_report()
-            print("Report generato con successo!")
+            try:
+                self.analyzer.invalidate_many(paths)
+                self.analyzer.generate_report()
+                print("Report generato con successo!")
 
-            # Mostra il percorso dell'ultimo report generato
-            output_dir = self.analyzer.output_dir
-            reports = [f for f in os.listdir(output_dir) if f.startswith('codebase_report')]
-            if reports:
-                latest_report = max(reports, key=lambda x: os.path.getctime(os.path.join(output_dir, x)))
-                print(f"Ultimo report: {os.path.join(output_dir, latest_report)}")
+                # Mostra il percorso dell'ultimo report generato
+                output_dir = self.analyzer.output_dir
+                reports = [f for f in os.listdir(output_dir) if f.startswith('codebase_report')]
+                if reports:
+                    latest_report = max(reports, key=lambda x: os.path.getctime(os.path.join(output_dir, x)))
+                    print(f"Ultimo report: {os.path.join(output_dir, latest_report)}")
 
-        except Exception as e:
-            print(f"Errore durante la generazione del report: {e}")
+            except Exception as e:
+                print(f"Errore durante la generazione del report: {e}")
 
 
 if __name__ == '__main__':
@@ -99,7 +127,7 @@ if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(description='Django Code Analyzer Watcher')
     parser.add_argument('--dir', '-d', default='./', help='Directory principale da monitorare')
-    parser.add_argument('--cooldown', '-c', type=int, default=5, help='Tempo minimo tra le analisi (secondi)')
+    parser.add_argument('--cooldown', '-c', type=int, default=5, help='Attesa dopo l\'ultima modifica prima dell\'analisi (secondi)')
     parser.add_argument('--include', '-i', nargs='+', help='Lista delle directory da includere nel monitoraggio')
 
     args = parser.parse_args()
@@ -114,4 +142,4 @@ if __name__ == '__main__':
 
     # Avvia il monitoraggio
     watcher = DjangoWatcher(args.dir, args.cooldown, args.include)
-    watcher.run()
\ No newline at end of file
+    watcher.run(analyzer)
\ No newline at end of file